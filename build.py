@@ -5,10 +5,13 @@ Rust 跨平台编译工具
 """
 
 import argparse
+import functools
+import json
 import os
 import shutil
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 # 目标平台列表
@@ -31,15 +34,26 @@ NON_WINDOWS_TARGETS = [
     "x86_64-unknown-linux-gnu",
 ]
 
+# 目标平台元信息（启动时算好，热路径上的分类全部变成字典查找）
+_TARGET_META = {
+    t: {'exe': '.exe' if 'windows' in t else '', 'windows': 'windows' in t}
+    for t in TARGETS
+}
+
 # 输出目录
 DIST_DIR = "dist"
 
 # 配置文件路径
 TOOLS_CONFIG = "config/tools.toml"
 
+# cargo 编译缓存目录：跨运行持久，公共依赖只编译一次，
+# 按目标平台分子目录隔离，避免并发任务竞争同一个 .cargo-lock
+CARGO_CACHE_DIR = Path(".cache/cargo-target")
+
 
+@functools.lru_cache(maxsize=1)
 def load_tools_config():
-    """加载 tools.toml 配置文件"""
+    """加载 tools.toml 配置文件（每个进程只解析一次）"""
     try:
         # 尝试使用 Python 3.11+ 的 tomllib
         import tomllib
@@ -72,6 +86,8 @@ def save_tools_config(config):
             print("错误: 需要 tomli_w 或 toml 包来保存配置")
             print("安装 toml 包: pip install toml")
             sys.exit(1)
+    # 配置文件已变更，使缓存失效
+    load_tools_config.cache_clear()
 
 
 def get_tools():
@@ -88,7 +104,8 @@ def get_tool_version(tool):
 
 def tool_exists(tool):
     """检查工具是否在配置中"""
-    return tool in get_tools()
+    # 直接查字典成员，O(1)，不构造中间列表
+    return tool in load_tools_config().get('tools', {})
 
 
 def get_output_dir(tool, target):
@@ -97,10 +114,8 @@ def get_output_dir(tool, target):
 
 
 def get_exe_ext(target):
-    """获取二进制文件扩展名"""
-    if target.startswith('x86_64-pc-windows') or target.startswith('aarch64-pc-windows'):
-        return '.exe'
-    return ''
+    """获取二进制文件扩展名（未知目标平台直接 KeyError）"""
+    return _TARGET_META[target]['exe']
 
 
 def get_cargo_bin():
@@ -109,74 +124,83 @@ def get_cargo_bin():
     return Path(cargo_home) / 'bin'
 
 
-def get_installed_binaries(tool, target):
-    """获取 cargo install 安装的所有二进制文件"""
+@functools.lru_cache(maxsize=1)
+def _cargo_bin_listing():
+    """扫描一次 cargo bin 目录，返回其中的文件名集合
+
+    后续查找全部变成内存里的集合成员测试，避免对每个候选文件名反复 stat。
+    """
     cargo_bin = get_cargo_bin()
-    exe_ext = get_exe_ext(target)
-    
-    # 可能的二进制文件名列表
-    # 1. 工具名本身 (如 flamegraph)
-    # 2. cargo-工具名 (如 cargo-flamegraph)
-    possible_names = [
-        f"{tool}{exe_ext}",
-        f"cargo-{tool}{exe_ext}",
-    ]
-    
-    # 查找所有存在的二进制文件
-    installed_binaries = []
-    for name in possible_names:
-        binary_path = cargo_bin / name
-        if binary_path.exists():
-            installed_binaries.append(name)
-    
-    # 如果没找到预期的二进制文件，尝试列出 cargo bin 目录中所有文件
-    # 查找所有以工具名开头的文件
-    if not installed_binaries:
-        if cargo_bin.exists():
-            for file in cargo_bin.iterdir():
-                if file.is_file() and not file.suffix == '.d' and not file.suffix == '.pdb':
-                    file_name = file.name
-                    # 检查是否以工具名开头（忽略扩展名）
-                    file_base = file_name.replace(exe_ext, '')
-                    if file_base == tool or file_base == f"cargo-{tool}":
-                        installed_binaries.append(file_name)
-    
-    return installed_binaries
+    if not cargo_bin.exists():
+        return frozenset()
+    return frozenset(p.name for p in cargo_bin.iterdir() if p.is_file())
+
+
+def _parse_built_executables(message_output):
+    """从 cargo --message-format=json 输出中提取编译出的二进制文件路径
+
+    cargo 会为每个 bin target 发出带 executable 字段的 compiler-artifact
+    记录，直接读取即可，无需再按文件名猜测 cargo bin 目录里的产物。
+    """
+    executables = []
+    for line in message_output.splitlines():
+        line = line.strip()
+        if not line.startswith('{'):
+            continue
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if (message.get('reason') == 'compiler-artifact'
+                and message.get('executable')
+                and 'bin' in message.get('target', {}).get('kind', [])):
+            path = Path(message['executable'])
+            if path not in executables:
+                executables.append(path)
+    return executables
+
+
+@functools.lru_cache(maxsize=1)
+def _installed_versions():
+    """解析 cargo install --list 输出，返回 {工具名: 版本} 映射（每批次只执行一次）"""
+    versions = {}
+    result = run_command(["cargo", "install", "--list"], check=False, capture_output=True)
+    if getattr(result, 'returncode', 1) == 0 and result.stdout:
+        for line in result.stdout.split('\n'):
+            line = line.strip()
+            # cargo install --list 输出格式: "tool_name v0.1.0:" （二进制列表行有缩进，split 后同样适用）
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].endswith(':'):
+                version = parts[1].rstrip(':')
+                if not version.startswith('v'):
+                    version = f"v{version}"
+                versions[parts[0]] = version
+    return versions
 
 
 def get_installed_version(tool):
     """获取已安装工具的实际版本"""
     try:
-        # 方法1: 使用 cargo install --list
-        result = run_command("cargo install --list", check=False, capture_output=True)
-        if result.returncode == 0 and result.stdout:
-            for line in result.stdout.split('\n'):
-                line = line.strip()
-                # cargo install --list 输出格式: "tool_name v0.1.0:" 或 "cargo-tool_name v0.1.0:"
-                if line.startswith(f"{tool} ") or line.startswith(f"cargo-{tool} "):
-                    # 提取版本号
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        version = parts[1].rstrip(':')
-                        if not version.startswith('v'):
-                            version = f"v{version}"
-                        return version
-        
+        # 方法1: 查询 cargo install --list 的缓存结果
+        versions = _installed_versions()
+        for name in (tool, f"cargo-{tool}"):
+            if name in versions:
+                return versions[name]
+
         # 方法2: 尝试运行二进制文件的 --version（先尝试 Windows 格式，再尝试 Linux 格式）
         cargo_bin = get_cargo_bin()
-        
+        listing = _cargo_bin_listing()
+
         # 尝试不同的扩展名
         for exe_ext in ['.exe', '']:
             binary_name = f"{tool}{exe_ext}"
-            binary_path = cargo_bin / binary_name
-            
-            if not binary_path.exists():
+            if binary_name not in listing:
                 binary_name = f"cargo-{tool}{exe_ext}"
+
+            if binary_name in listing:
                 binary_path = cargo_bin / binary_name
-            
-            if binary_path.exists():
                 try:
-                    result = run_command(f'"{binary_path}" --version', check=False, capture_output=True)
+                    result = run_command([str(binary_path), "--version"], check=False, capture_output=True)
                     if result.returncode == 0 and result.stdout:
                         # 版本输出格式通常是 "tool_name 0.1.0" 或 "tool_name v0.1.0"
                         output = result.stdout.strip()
@@ -195,54 +219,122 @@ def get_installed_version(tool):
         return "unknown"
 
 
-def run_command(cmd, check=True, capture_output=False):
-    """运行命令"""
+def _link_or_copy(src, dst):
+    """优先硬链接，跨文件系统时回退到复制
+
+    $CARGO_HOME/bin 和 dist/ 通常在同一文件系统上，硬链接是零拷贝的；
+    只有跨设备（EXDEV 等 OSError）时才真正读写一遍文件内容。
+    """
+    dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        # copyfile 在 Linux 上走 copy_file_range/sendfile 快速路径，
+        # 内容不经过用户态缓冲；只需要再补一次权限位（时间戳不重要）
+        shutil.copyfile(src, dst)
+        shutil.copymode(src, dst)
+
+
+def run_command(argv, check=True, capture_output=False, capture_stdout=False, env=None):
+    """运行命令（argv 为参数列表，不经过 shell）
+
+    capture_stdout 只截获 stdout（用于机器可读输出），stderr 仍实时透传。
+    """
     try:
         result = subprocess.run(
-            cmd,
-            shell=True,
+            argv,
             check=check,
             capture_output=capture_output,
-            text=True
+            stdout=subprocess.PIPE if capture_stdout and not capture_output else None,
+            text=True,
+            env=env
         )
         return result
     except subprocess.CalledProcessError as e:
         if check:
-            print(f"错误: 命令执行失败: {cmd}")
+            print(f"错误: 命令执行失败: {' '.join(argv)}")
             print(f"返回码: {e.returncode}")
             sys.exit(1)
         return e
+    except FileNotFoundError:
+        # 可执行文件不存在（shell 场景下的返回码 127），按失败结果处理，
+        # check=False 的调用方靠 returncode 优雅降级
+        if check:
+            print(f"错误: 命令执行失败: {' '.join(argv)}")
+            print(f"找不到可执行文件: {argv[0]}")
+            sys.exit(1)
+        return subprocess.CompletedProcess(argv, 127, stdout=None, stderr=None)
+
+
+def _build_result(tool, target, ok, error=None):
+    """构造单次编译的结果字典"""
+    return {'tool': tool, 'target': target, 'ok': ok, 'error': error}
+
+
+# 已安装目标工具链的进程内缓存，None 表示尚未向 rustup 查询过
+_INSTALLED_TARGETS = None
+
+
+def _get_installed_targets():
+    """获取已安装的目标工具链集合（每个进程只查询一次 rustup）"""
+    global _INSTALLED_TARGETS
+    if _INSTALLED_TARGETS is None:
+        result = run_command(["rustup", "target", "list", "--installed"], check=False, capture_output=True)
+        if getattr(result, 'returncode', 1) == 0 and result.stdout:
+            _INSTALLED_TARGETS = {line.strip() for line in result.stdout.splitlines() if line.strip()}
+        else:
+            _INSTALLED_TARGETS = set()
+    return _INSTALLED_TARGETS
+
+
+def _prepare_targets(targets):
+    """编译前置步骤：串行安装目标工具链，避免并发任务竞争 rustup
 
+    缺失的目标合并到一次 rustup target add 调用（rustup 支持多个参数），
+    已安装的目标直接跳过，省掉逐个 spawn rustup 进程的开销。
+    """
+    installed = _get_installed_targets()
+    pending = [target for target in targets if target not in installed]
+    if not pending:
+        return
+    print(f"  安装目标工具链: {' '.join(pending)}...")
+    result = run_command(["rustup", "target", "add", *pending], check=False)
+    if getattr(result, 'returncode', 1) == 0:
+        installed.update(pending)
+
+
+def _cargo_jobs(parallel_jobs=1):
+    """计算单个 cargo 进程可用的编译线程数
 
-def build_tool(tool, target):
-    """编译单个工具到指定目标平台"""
+    优先遵循 CARGO_BUILD_JOBS；并发执行多个 cargo 时按任务数均分 CPU，
+    避免总线程数超过核数导致的调度抖动（容器里 cargo 自测的核数也不可靠）。
+    """
+    env_jobs = os.environ.get('CARGO_BUILD_JOBS')
+    if env_jobs and env_jobs.isdigit():
+        return int(env_jobs)
+    return max(1, (os.cpu_count() or 1) // max(1, parallel_jobs))
+
+
+def build_tool(tool, target, jobs=None):
+    """编译单个工具到指定目标平台，返回结果字典"""
     print(f"正在编译 {tool} 到 {target}...")
-    
+
     # 检查工具是否存在
     if not tool_exists(tool):
         print(f"错误: 工具 '{tool}' 在 tools.toml 中不存在")
-        sys.exit(1)
-    
+        return _build_result(tool, target, False, "工具不存在")
+
     # 检查目标平台是否有效
-    if target not in TARGETS:
+    if target not in _TARGET_META:
         print(f"错误: 无效的目标平台 '{target}'")
-        sys.exit(1)
-    
-    # 确保目标工具链已安装
-    print(f"  检查目标工具链 {target}...")
-    run_command(f"rustup target add {target}", check=False)
-    
+        return _build_result(tool, target, False, "无效的目标平台")
+
     # 配置交叉编译链接器
     env = os.environ.copy()
+    env["CARGO_TARGET_DIR"] = str((CARGO_CACHE_DIR / target).resolve())
     if target == "aarch64-unknown-linux-gnu":
         # 检查交叉编译工具链是否已安装
-        result = subprocess.run(
-            "which aarch64-linux-gnu-gcc",
-            shell=True,
-            capture_output=True,
-            text=True
-        )
-        if result.returncode != 0:
+        if shutil.which("aarch64-linux-gnu-gcc") is None:
             print(f"  ⚠ 警告: 未找到 aarch64-linux-gnu-gcc 交叉编译工具链")
             print(f"     请安装: sudo apt-get install gcc-aarch64-linux-gnu")
             print(f"     或: sudo yum install gcc-aarch64-linux-gnu")
@@ -251,13 +343,7 @@ def build_tool(tool, target):
             print(f"  ✓ 已配置链接器: aarch64-linux-gnu-gcc")
     elif target == "x86_64-pc-windows-gnu":
         # 检查 MinGW 交叉编译工具链
-        result = subprocess.run(
-            "which x86_64-w64-mingw32-gcc",
-            shell=True,
-            capture_output=True,
-            text=True
-        )
-        if result.returncode != 0:
+        if shutil.which("x86_64-w64-mingw32-gcc") is None:
             print(f"  ⚠ 警告: 未找到 x86_64-w64-mingw32-gcc 交叉编译工具链")
             print(f"     请安装: sudo apt-get install mingw-w64")
             print(f"     或: sudo yum install mingw64-gcc")
@@ -267,48 +353,47 @@ def build_tool(tool, target):
     
     # 获取版本
     version = get_tool_version(tool)
-    version_flag = f"--version {version}" if version != "latest" else ""
-    
+
     # 创建输出目录
     output_dir = get_output_dir(tool, target)
     output_dir.mkdir(parents=True, exist_ok=True)
-    
+
     # 编译工具
+    # --locked 使用 crate 自带的 Cargo.lock，跳过依赖解析且结果可复现；
+    # -j 显式给出线程数，容器中 cargo 的默认探测不一定等于可用核数
     print(f"  使用 cargo install 编译...")
-    if version_flag:
-        cmd = f"cargo install --target {target} {version_flag} {tool} --force"
-    else:
-        cmd = f"cargo install --target {target} {tool} --force"
-    
-    # 使用配置的环境变量运行命令
-    result = subprocess.run(
-        cmd,
-        shell=True,
-        env=env,
-        check=False
-    )
+    cmd = ["cargo", "install", "--target", target, "--locked",
+           "-j", str(jobs if jobs else _cargo_jobs()),
+           "--message-format", "json"]
+    if version != "latest":
+        cmd += ["--version", version]
+    cmd += [tool, "--force"]
+
+    # 使用配置的环境变量运行命令；截获 stdout 上的 JSON 消息，编译日志仍走 stderr
+    result = run_command(cmd, check=False, capture_stdout=True, env=env)
     if result.returncode != 0:
-        print(f"错误: 命令执行失败: {cmd}")
+        print(f"错误: 命令执行失败: {' '.join(cmd)}")
         print(f"返回码: {result.returncode}")
-        sys.exit(1)
-    
-    # 获取所有安装的二进制文件
-    cargo_bin = get_cargo_bin()
-    installed_binaries = get_installed_binaries(tool, target)
-    
-    if not installed_binaries:
-        print(f"  ✗ 错误: 找不到任何二进制文件")
-        print(f"    检查目录: {cargo_bin}")
-        sys.exit(1)
+        return _build_result(tool, target, False, "cargo install 失败")
+
+    # 安装集合已变化，使版本/目录缓存失效，后续查询重新扫描一次
+    _installed_versions.cache_clear()
+    _cargo_bin_listing.cache_clear()
+
+    # 从 cargo 的 JSON 消息中直接拿到编译出的二进制文件路径
+    executables = _parse_built_executables(result.stdout or '')
+
+    if not executables:
+        print(f"  ✗ 错误: cargo 输出中未找到任何二进制文件")
+        return _build_result(tool, target, False, "找不到二进制文件")
     
-    # 复制所有二进制文件到输出目录
+    # 复制所有二进制文件到输出目录；每个工具通常只有一两个二进制，
+    # 且外层已按 target 并发构建，这里保持顺序复制即可
     copied_files = []
-    for binary_name in installed_binaries:
-        source_binary = cargo_bin / binary_name
-        if source_binary.exists():
-            shutil.copy2(source_binary, output_dir / binary_name)
-            copied_files.append(binary_name)
-            print(f"  ✓ 复制 {binary_name} -> {output_dir / binary_name}")
+    for exe_path in executables:
+        _link_or_copy(exe_path, output_dir / exe_path.name)
+        copied_files.append(exe_path.name)
+        print(f"  ✓ 复制 {exe_path.name} -> {output_dir / exe_path.name}")
     
     if copied_files:
         print(f"  ✓ 成功编译 {tool} 到 {target}，共 {len(copied_files)} 个二进制文件")
@@ -317,24 +402,54 @@ def build_tool(tool, target):
         actual_version = get_installed_version(tool)
         tool_dir = get_output_dir(tool, target).parent
         version_file = tool_dir / "version"
-        with open(version_file, 'w', encoding='utf-8') as f:
-            f.write(actual_version)
+        version_file.write_text(actual_version, encoding='utf-8')
         print(f"  ✓ 版本信息: {actual_version} -> {version_file}")
     else:
         print(f"  ✗ 错误: 无法复制任何二进制文件")
-        sys.exit(1)
+        return _build_result(tool, target, False, "无法复制二进制文件")
+
+    return _build_result(tool, target, True)
+
+
+def _run_build_jobs(pairs, targets):
+    """并发执行 (tool, target) 编译任务
+
+    同一 target 的任务共享一个 CARGO_TARGET_DIR，cargo 会对构建目录加
+    排他锁，并发提交只会在锁上串行空等；因此按 target 分队列，每个
+    target 一个工作线程依次消费自己的工具队列，不同 target 之间并行，
+    目标工具链在提交任务前统一安装。
+    """
+    _prepare_targets(targets)
+    # 按 target 分组，组内保持原有提交顺序
+    queues = {}
+    for tool, target in pairs:
+        queues.setdefault(target, []).append(tool)
+    # tools.toml 里没有配置任何工具时无任务可做（线程池宽度不能为 0）
+    if not queues:
+        return
+    # 同时在跑的 cargo 数量等于不同 target 的数量，按它均分 CPU
+    jobs = _cargo_jobs(len(queues))
+
+    def _drain_target(target, tools):
+        for tool in tools:
+            result = build_tool(tool, target, jobs)
+            if not result['ok']:
+                print(f"  跳过 {tool} 的 {target} 编译")
+
+    with ThreadPoolExecutor(max_workers=len(queues)) as executor:
+        futures = [
+            executor.submit(_drain_target, target, tools)
+            for target, tools in queues.items()
+        ]
+        for future in as_completed(futures):
+            future.result()
 
 
 def build_all():
     """编译所有工具到所有目标平台"""
     tools = get_tools()
-    for tool in tools:
-        for target in TARGETS:
-            try:
-                build_tool(tool, target)
-            except SystemExit:
-                print(f"  跳过 {tool} 的 {target} 编译")
-                continue
+    pairs = [(tool, target) for tool in tools for target in TARGETS]
+    _run_build_jobs(pairs, TARGETS)
     print("所有编译任务完成!")
 
 
@@ -342,13 +457,8 @@ def build_windows():
     """编译所有工具到 Windows 目标平台"""
     print("开始编译 Windows 平台...")
     tools = get_tools()
-    for tool in tools:
-        for target in WINDOWS_TARGETS:
-            try:
-                build_tool(tool, target)
-            except SystemExit:
-                print(f"  跳过 {tool} 的 {target} 编译")
-                continue
+    pairs = [(tool, target) for tool in tools for target in WINDOWS_TARGETS]
+    _run_build_jobs(pairs, WINDOWS_TARGETS)
     print("所有 Windows 平台编译任务完成!")
 
 
@@ -356,13 +466,8 @@ def build_non_windows():
     """编译所有工具到非 Windows 目标平台（Linux）"""
     print("开始编译非 Windows 平台（Linux）...")
     tools = get_tools()
-    for tool in tools:
-        for target in NON_WINDOWS_TARGETS:
-            try:
-                build_tool(tool, target)
-            except SystemExit:
-                print(f"  跳过 {tool} 的 {target} 编译")
-                continue
+    pairs = [(tool, target) for tool in tools for target in NON_WINDOWS_TARGETS]
+    _run_build_jobs(pairs, NON_WINDOWS_TARGETS)
     print("所有非 Windows 平台编译任务完成!")
 
 
@@ -371,29 +476,21 @@ def build_tool_all_targets(tool):
     if not tool_exists(tool):
         print(f"错误: 工具 '{tool}' 在 tools.toml 中不存在")
         sys.exit(1)
-    
-    for target in TARGETS:
-        try:
-            build_tool(tool, target)
-        except SystemExit:
-            print(f"  跳过 {tool} 的 {target} 编译")
-            continue
+
+    pairs = [(tool, target) for target in TARGETS]
+    _run_build_jobs(pairs, TARGETS)
     print(f"工具 {tool} 的所有目标平台编译完成!")
 
 
 def build_target_all_tools(target):
     """编译所有工具到指定目标平台"""
-    if target not in TARGETS:
+    if target not in _TARGET_META:
         print(f"错误: 无效的目标平台 '{target}'")
         sys.exit(1)
-    
+
     tools = get_tools()
-    for tool in tools:
-        try:
-            build_tool(tool, target)
-        except SystemExit:
-            print(f"  跳过 {tool} 的 {target} 编译")
-            continue
+    pairs = [(tool, target) for tool in tools]
+    _run_build_jobs(pairs, [target])
     print(f"所有工具在 {target} 平台的编译完成!")
 
 
@@ -449,27 +546,21 @@ def add_tool(tool_name):
 def install_targets():
     """安装所有目标工具链"""
     print("正在安装所有目标工具链...")
-    for target in TARGETS:
-        print(f"  安装 {target}...")
-        run_command(f"rustup target add {target}", check=False)
+    _prepare_targets(TARGETS)
     print("所有目标工具链安装完成!")
 
 
 def install_windows_targets():
     """安装 Windows 目标工具链"""
     print("正在安装 Windows 目标工具链...")
-    for target in WINDOWS_TARGETS:
-        print(f"  安装 {target}...")
-        run_command(f"rustup target add {target}", check=False)
+    _prepare_targets(WINDOWS_TARGETS)
     print("所有 Windows 目标工具链安装完成!")
 
 
 def install_non_windows_targets():
     """安装非 Windows 目标工具链（Linux）"""
     print("正在安装非 Windows 目标工具链（Linux）...")
-    for target in NON_WINDOWS_TARGETS:
-        print(f"  安装 {target}...")
-        run_command(f"rustup target add {target}", check=False)
+    _prepare_targets(NON_WINDOWS_TARGETS)
     print("所有非 Windows 目标工具链安装完成!")
 
 
@@ -545,7 +636,11 @@ def main():
     
     # 执行对应命令
     if args.command == 'build':
-        build_tool(args.tool, args.target)
+        if args.target in _TARGET_META:
+            _prepare_targets([args.target])
+        result = build_tool(args.tool, args.target)
+        if not result['ok']:
+            sys.exit(1)
     elif args.command == 'build-all':
         build_all()
     elif args.command == 'build-windows':
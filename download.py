@@ -7,16 +7,101 @@
 import os
 import sys
 import json
+import http.client
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime
-from urllib.parse import urlparse
-from urllib.request import urlopen, Request
-from urllib.error import URLError, HTTPError
+from datetime import date
+from urllib.parse import urlsplit
+from urllib.error import URLError
 
 # 配置
 DIST_DIR = "dist"
 DOWNLOAD_CONFIG = "config/download.toml"
 
+# GitHub API 响应缓存文件：按 URL 记录 ETag 和响应体，
+# 重复运行时用条件请求（If-None-Match）换取 304 空响应，节省流量和速率限制
+API_CACHE_FILE = Path.home() / '.cache' / 'compile_rust_tool' / 'releases.json'
+
+_api_cache = None
+_api_cache_lock = threading.Lock()
+
+# 每个线程独立维护 {主机名: HTTPSConnection}，复用 keep-alive 连接，
+# 省掉每次请求重新建立 TLS 握手的开销（http.client 连接不是线程安全的）
+_thread_conns = threading.local()
+
+
+def _get_connection(host):
+    """获取（或创建）当前线程到指定主机的复用连接"""
+    conns = getattr(_thread_conns, 'conns', None)
+    if conns is None:
+        conns = _thread_conns.conns = {}
+    conn = conns.get(host)
+    if conn is None:
+        conn = conns[host] = http.client.HTTPSConnection(host, timeout=60)
+    return conn
+
+
+def _http_get(url, headers, max_redirects=5):
+    """在复用连接上发起 GET 请求，自动跟随重定向
+
+    返回 http.client.HTTPResponse；调用方必须把响应体读完，连接才能复用。
+    """
+    for _ in range(max_redirects):
+        parts = urlsplit(url)
+        conn = _get_connection(parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            # 连接可能已被服务端关闭，重建后重试一次
+            conn.close()
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+
+        # GitHub 的 asset 下载会重定向到 objects.githubusercontent.com
+        if response.status in (301, 302, 303, 307, 308):
+            location = response.getheader('Location')
+            response.read()
+            if not location:
+                return response
+            url = location
+            continue
+        return response
+
+    raise URLError(f"重定向次数过多: {url}")
+
+
+def _load_api_cache():
+    """加载 API 响应缓存（每个进程只读取一次）"""
+    global _api_cache
+    with _api_cache_lock:
+        if _api_cache is None:
+            try:
+                with open(API_CACHE_FILE, 'r', encoding='utf-8') as f:
+                    _api_cache = json.load(f)
+            except (OSError, ValueError):
+                _api_cache = {}
+    return _api_cache
+
+
+def _save_api_cache():
+    """把 API 响应缓存写回磁盘（失败不影响下载流程）"""
+    with _api_cache_lock:
+        try:
+            API_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(API_CACHE_FILE, 'w', encoding='utf-8') as f:
+                # 先拍快照再序列化，序列化期间其他线程的插入不影响遍历
+                json.dump(dict(_api_cache), f)
+        except Exception:
+            pass
+
 
 def load_download_config():
     """加载 download.toml 配置文件"""
@@ -41,17 +126,41 @@ def load_download_config():
 
 
 def fetch_json(url):
-    """获取 JSON 数据"""
+    """获取 JSON 数据（带 ETag 条件请求缓存）"""
+    cache = _load_api_cache()
+    cached = cache.get(url)
     try:
-        req = Request(url)
-        req.add_header('Accept', 'application/vnd.github.v3+json')
-        req.add_header('User-Agent', 'Python-download-script')
-        
-        with urlopen(req) as response:
-            return json.loads(response.read().decode('utf-8'))
-    except HTTPError as e:
-        print(f"HTTP 错误: {e.code} - {e.reason}")
-        return None
+        headers = {
+            'Accept': 'application/vnd.github.v3+json',
+            'User-Agent': 'Python-download-script',
+        }
+        # 配置 GITHUB_TOKEN 可把速率限制从 60/小时 提升到 5000/小时
+        token = os.environ.get('GITHUB_TOKEN')
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        if cached:
+            headers['If-None-Match'] = cached['etag']
+
+        response = _http_get(url, headers)
+
+        if response.status == 304 and cached:
+            # 远端无变化，直接使用缓存的响应体
+            response.read()
+            return cached['body']
+        if response.status >= 400:
+            response.read()
+            print(f"HTTP 错误: {response.status} - {response.reason}")
+            return None
+
+        # 直接从响应流解析，避免先整体读入 bytes 再解码为 str
+        data = json.load(response)
+        etag = response.getheader('ETag')
+        if etag:
+            # 缓存字典被多个下载线程共享，写入须与落盘时的遍历互斥
+            with _api_cache_lock:
+                cache[url] = {'etag': etag, 'body': data}
+            _save_api_cache()
+        return data
     except URLError as e:
         print(f"URL 错误: {e.reason}")
         return None
@@ -60,39 +169,41 @@ def fetch_json(url):
         return None
 
 
+# 按仓库记忆化的 release 列表：多个配置项共享同一仓库时，列表接口只请求一次
+_releases_cache = {}
+
+
+def _releases(repo):
+    """获取仓库的 release 列表（进程内按仓库缓存）"""
+    if repo not in _releases_cache:
+        _releases_cache[repo] = fetch_json(f"https://api.github.com/repos/{repo}/releases")
+    return _releases_cache[repo]
+
+
 def get_release_by_date(repo, date_str):
     """根据日期获取 release"""
-    api_url = f"https://api.github.com/repos/{repo}/releases"
-    
-    releases = fetch_json(api_url)
+    releases = _releases(repo)
     if not releases:
         return None
-    
+
     try:
-        # 解析日期
-        target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        
-        # 查找匹配日期的 release
-        for release in releases:
-            published_at = datetime.strptime(
-                release['published_at'], 
-                "%Y-%m-%dT%H:%M:%SZ"
-            ).date()
-            
-            if published_at == target_date:
-                return release
-        
+        # 校验日期格式（fromisoformat 为 C 实现，远快于 strptime）
+        date.fromisoformat(date_str)
+
+        # published_at 本身就是 ISO 格式，前 10 位即日期，按日期建索引后 O(1) 查找
+        # 倒序建表让列表靠前（较新）的 release 优先，与原有逐个遍历的语义一致
+        by_date = {r['published_at'][:10]: r for r in reversed(releases)}
+        release = by_date.get(date_str)
+        if release:
+            return release
+
         print(f"警告: 未找到 {date_str} 日期的 release")
         print("可用的 releases:")
         for release in releases[:10]:  # 显示前10个
-            published_at = datetime.strptime(
-                release['published_at'], 
-                "%Y-%m-%dT%H:%M:%SZ"
-            ).date()
-            print(f"  - {release['tag_name']}: {published_at}")
-        
+            print(f"  - {release['tag_name']}: {release['published_at'][:10]}")
+
         return None
-        
+
     except Exception as e:
         print(f"错误: {e}")
         return None
@@ -100,6 +211,13 @@ def get_release_by_date(repo, date_str):
 
 def get_release_by_tag(repo, tag):
     """根据标签获取 release"""
+    # 先在已缓存的 release 列表中查找，命中则省一次 API 请求
+    releases = _releases_cache.get(repo)
+    if releases:
+        for release in releases:
+            if release.get('tag_name') == tag:
+                return release
+
     api_url = f"https://api.github.com/repos/{repo}/releases/tags/{tag}"
     return fetch_json(api_url)
 
@@ -110,60 +228,80 @@ def get_latest_release(repo):
     return fetch_json(api_url)
 
 
-def find_asset_url(release, filename):
-    """在 release 中查找指定的 asset URL"""
+def find_asset(release, filename):
+    """在 release 中查找指定的 asset，返回完整的 asset 字典（含 size、下载 URL）"""
     if not release or 'assets' not in release:
         return None
-    
+
     for asset in release['assets']:
         if asset['name'] == filename:
-            return asset['browser_download_url']
-    
+            return asset
+
     print(f"错误: 在 release {release.get('tag_name', 'unknown')} 中未找到 {filename}")
     print("可用的 assets:")
     for asset in release['assets']:
         print(f"  - {asset['name']}")
-    
+
     return None
 
 
+class _ProgressReader:
+    """包装响应流，在读取时统计进度并限频打印（最多每 0.1 秒一次）
+
+    stdout 不是终端（CI 管道/日志）时完全不打印进度，
+    避免成千上万次 write+flush 落进日志。
+    """
+
+    def __init__(self, response, total_size, interactive=True):
+        self._response = response
+        self._total_size = total_size
+        self._interactive = interactive
+        self.downloaded = 0
+        self._last_print = 0.0
+
+    def read(self, size=-1):
+        chunk = self._response.read(size)
+        self.downloaded += len(chunk)
+
+        if not self._interactive:
+            return chunk
+
+        now = time.monotonic()
+        if self._total_size > 0 and now - self._last_print > 0.1:
+            self._last_print = now
+            percent = (self.downloaded / self._total_size) * 100
+            print(f"\r  进度: {percent:.1f}% ({self.downloaded}/{self._total_size} bytes)", end='', flush=True)
+        return chunk
+
+
 def download_file(url, output_path):
     """下载文件"""
     try:
         print(f"正在下载: {url}")
-        
-        req = Request(url)
-        req.add_header('User-Agent', 'Python-download-script')
-        
+
         # 创建输出目录
         output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        with urlopen(req) as response:
-            # 获取文件大小
-            total_size = int(response.headers.get('Content-Length', 0))
-            
-            # 下载文件
-            downloaded = 0
-            chunk_size = 8192
-            
-            with open(output_path, 'wb') as f:
-                while True:
-                    chunk = response.read(chunk_size)
-                    if not chunk:
-                        break
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    
-                    if total_size > 0:
-                        percent = (downloaded / total_size) * 100
-                        print(f"\r  进度: {percent:.1f}% ({downloaded}/{total_size} bytes)", end='', flush=True)
-        
-        print(f"\n  ✓ 下载完成: {output_path}")
+
+        response = _http_get(url, {'User-Agent': 'Python-download-script'})
+        if response.status >= 400:
+            response.read()
+            print(f"\n错误: HTTP 错误 {response.status} - {response.reason}")
+            return False
+
+        # 获取文件大小
+        total_size = int(response.getheader('Content-Length') or 0)
+
+        # 用 1 MiB 缓冲整块拷贝，避免 8 KiB 小块在 Python 层循环上万次
+        interactive = sys.stdout.isatty()
+        tracker = _ProgressReader(response, total_size, interactive)
+        with open(output_path, 'wb') as f:
+            shutil.copyfileobj(tracker, f, length=1 << 20)
+
+        if interactive:
+            print()
+        print(f"  ✓ 下载完成: {output_path} ({tracker.downloaded} bytes)")
         return True
-        
-    except HTTPError as e:
-        print(f"\n错误: HTTP 错误 {e.code} - {e.reason}")
-        return False
+
     except URLError as e:
         print(f"\n错误: URL 错误 - {e.reason}")
         return False
@@ -220,16 +358,22 @@ def download_item(item_name, item_config):
         print(f"  错误: 未找到指定的 release")
         return False
     
-    # 查找下载 URL
-    download_url = find_asset_url(release, filename)
-    if not download_url:
+    # 查找 asset
+    asset = find_asset(release, filename)
+    if not asset:
         return False
-    
-    # 下载文件
+
+    # 本地文件大小与 release 中记录的一致时跳过下载，重复运行零流量
     output_path = Path(DIST_DIR) / output_dir / filename
+    asset_size = asset.get('size')
+    if asset_size and output_path.exists() and output_path.stat().st_size == asset_size:
+        print(f"  ✓ 已是最新: {output_path} ({asset_size} bytes)")
+        return True
+
+    # 下载文件
     print(f"  目标文件: {output_path}")
-    
-    if download_file(download_url, output_path):
+
+    if download_file(asset['browser_download_url'], output_path):
         print(f"  ✓ 成功下载到: {output_path}")
         return True
     else:
@@ -280,18 +424,19 @@ def main():
         sys.exit(0 if success else 1)
     else:
         # 下载所有项
+        # 各配置项相互独立且是网络瓶颈，用线程池并发下载（urlopen/文件 IO 会释放 GIL）
         print(f"开始下载所有配置项...")
         print("=" * 60)
-        
-        success_count = 0
-        fail_count = 0
-        
-        for item_name, item_config in downloads.items():
-            if download_item(item_name, item_config):
-                success_count += 1
-            else:
-                fail_count += 1
-        
+
+        with ThreadPoolExecutor(max_workers=min(8, len(downloads) or 1)) as executor:
+            results = list(executor.map(
+                lambda kv: download_item(*kv),
+                downloads.items()
+            ))
+
+        success_count = sum(1 for ok in results if ok)
+        fail_count = len(results) - success_count
+
         print("=" * 60)
         print(f"下载完成！成功: {success_count}, 失败: {fail_count}")
 
@@ -4,17 +4,45 @@
 根据 tools.toml 配置决定是否压缩以及压缩格式
 """
 
+import functools
+import hashlib
 import os
 import json
+import shutil
+import subprocess
 import zipfile
 import tarfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
+# TOML 解析器在导入时确定一次：优先 Python 3.11+ 内置的 tomllib，其次 toml 包
+try:
+    import tomllib as _toml
+    _TOML_BINARY = True
+except ImportError:
+    try:
+        import toml as _toml
+        _TOML_BINARY = False
+    except ImportError:
+        _toml = None
+        _TOML_BINARY = False
+
+# JSON 序列化器：orjson 是 C 实现，可用时清单写出快数倍；缺失则回退标准库
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
 # 目录配置
 DIST_DIR = "dist"
 TOOLS_CONFIG = "config/tools.toml"
 MANIFEST_FILE = "manifest.json"
+# 清单文件名去掉扩展名（遍历 dist 时用来排除同名目录）
+MANIFEST_STEM = Path(MANIFEST_FILE).stem
+# 压缩输入指纹缓存：输入文件集合未变化时跳过重建压缩包
+ARCHIVE_CACHE_FILE = ".archive-cache.json"
 
 # 目标平台列表
 TARGETS = [
@@ -24,6 +52,9 @@ TARGETS = [
     "x86_64-unknown-linux-gnu",
 ]
 
+# 成员判断与集合运算用的冻结集合，避免每个工具重新构造 set(TARGETS)
+TARGETS_SET = frozenset(TARGETS)
+
 # Windows 目标平台列表
 WINDOWS_TARGETS = [
     "x86_64-pc-windows-gnu",
@@ -36,23 +67,34 @@ NON_WINDOWS_TARGETS = [
     "x86_64-unknown-linux-gnu",
 ]
 
+# 压缩等级：被压缩的是已 strip 的二进制，冗余度低，
+# 默认等级（xz=6、bz2=9）花数倍 CPU 只换来几个百分点的体积收益
+XZ_PRESET = 3
+BZ2_COMPRESSLEVEL = 1
+ZSTD_LEVEL = 3
+
+# 压缩进程池宽度；pigz 线程数按它均分总核数，避免调度出 cpu² 个线程
+ARCHIVE_POOL_WORKERS = os.cpu_count() or 1
 
+# 归档输出缓冲区大小：大块写入减少 write 系统调用次数
+ARCHIVE_BUFFER_SIZE = 1 << 20
+# 是否输出逐文件的添加日志（CI 上 stdout 常是管道，每行都是一次 write）
+VERBOSE = bool(os.environ.get('POST_VERBOSE'))
+# tar 记录缓冲（最大允许的 20 倍记录块）
+TAR_BUFSIZE = 65536
+
+
+@functools.lru_cache(maxsize=1)
 def load_tools_config():
-    """加载 tools.toml 配置文件"""
-    try:
-        # 尝试使用 Python 3.11+ 的 tomllib
-        import tomllib
+    """加载 tools.toml 配置文件（每个进程只解析一次）"""
+    if _toml is None:
+        print("警告: 无法加载 tools.toml，将使用默认配置")
+        return {'tools': {}}
+    if _TOML_BINARY:
         with open(TOOLS_CONFIG, 'rb') as f:
-            return tomllib.load(f)
-    except ImportError:
-        try:
-            # 尝试使用 toml 包
-            import toml
-            with open(TOOLS_CONFIG, 'r', encoding='utf-8') as f:
-                return toml.load(f)
-        except ImportError:
-            print("警告: 无法加载 tools.toml，将使用默认配置")
-            return {'tools': {}}
+            return _toml.load(f)
+    with open(TOOLS_CONFIG, 'r', encoding='utf-8') as f:
+        return _toml.load(f)
 
 
 def get_tool_version(tool_name):
@@ -77,39 +119,98 @@ def is_windows_target(target_name):
     return target_name in WINDOWS_TARGETS
 
 
-def get_files_to_compress(tool_dir, target_dir, tool_name):
-    """获取需要压缩的文件列表"""
+# 压缩任务传给子进程的文件引用（DirEntry 不可 pickle，用轻量元组代替），
+# 连同 scandir 缓存的元数据一起带过去，压缩侧不用再 stat
+FileRef = namedtuple('FileRef', ['path', 'name', 'size', 'mtime', 'mode'])
+
+
+def list_target(target_dir):
+    """扫描一次目标目录，返回文件的 DirEntry 列表
+
+    DirEntry 缓存了首次 getdents 拿到的 stat 结果，后续的
+    is_file()/stat() 不再触发额外的 stat 系统调用。
+    """
+    with os.scandir(target_dir) as it:
+        return [entry for entry in it if entry.is_file()]
+
+
+def walk_dist(dist_path):
+    """单次遍历 dist 树，逐项产出 (工具名, 目标平台, [DirEntry, ...])
+
+    所有需要目录内容的阶段都从这一次遍历的结果出发，
+    避免压缩、清单收集各自重复扫描同一棵树。
+    """
+    with os.scandir(dist_path) as tools:
+        for tool_entry in tools:
+            if not tool_entry.is_dir():
+                continue
+            with os.scandir(tool_entry.path) as targets:
+                for target_entry in targets:
+                    if target_entry.is_dir():
+                        yield tool_entry.name, target_entry.name, list_target(target_entry.path)
+
+
+def prefetch_dist(dist_path):
+    """处理开始前一次性预扫描 dist 树，返回 {(工具名, 目标平台): [DirEntry, ...]}"""
+    return {
+        (tool_name, target_name): entries
+        for tool_name, target_name, entries in walk_dist(dist_path)
+    }
+
+
+# 预编译的匹配表：startswith/endswith 接受元组参数，单次 C 层调用
+# 即可完成多前缀/多后缀匹配，避免每个文件跑一轮 Python 循环
+FLAMEGRAPH_PREFIXES = ("flamegraph", "cargo-flamegraph")
+COMPRESSED_EXTS = ('.zip', '.7z', '.tar.gz', '.tar.xz', '.tar.bz2', '.tar.zst',
+                   '.tgz', '.txz', '.tbz2', '.tzst', '.zst')
+
+
+def get_files_to_compress(entries, tool_name):
+    """从目录扫描结果中筛选需要压缩的文件"""
     files_to_compress = []
-    # 排除已有的压缩文件
-    compressed_extensions = ['.zip', '.7z', '.tar.gz', '.tar.xz', '.tar.bz2', '.tgz', '.txz', '.tbz2']
-    
-    for file in target_dir.iterdir():
-        if file.is_file():
-            # 检查是否是压缩文件
-            is_compressed = any(file.name.endswith(ext) for ext in compressed_extensions)
-            if not is_compressed:
-                # 对于 flamegraph，打包 flamegraph 和 cargo-flamegraph
-                # 对于其他工具，打包所有文件
-                if tool_name == "flamegraph":
-                    file_name = file.name
-                    if file_name.startswith("flamegraph") or file_name.startswith("cargo-flamegraph"):
-                        files_to_compress.append(file)
-                else:
-                    # 其他工具打包所有文件
-                    files_to_compress.append(file)
-    
+
+    for entry in entries:
+        # 排除已有的压缩文件
+        if not entry.name.endswith(COMPRESSED_EXTS):
+            # 对于 flamegraph，打包 flamegraph 和 cargo-flamegraph
+            # 对于其他工具，打包所有文件
+            if tool_name == "flamegraph":
+                if entry.name.startswith(FLAMEGRAPH_PREFIXES):
+                    files_to_compress.append(entry)
+            else:
+                # 其他工具打包所有文件
+                files_to_compress.append(entry)
+
     return files_to_compress
 
 
+# 这些扩展名的文件（原生可执行文件 / 已压缩产物）deflate 收益极小，
+# 直接原样存储，把 zip 创建从 zlib CPU 循环变成接近 memcpy 的拷贝
+ZIP_STORED_EXTS = ('.exe', '.dll', '.so', '.zip', '.7z',
+                   '.tar.gz', '.tar.xz', '.tar.bz2', '.gz', '.xz', '.zst')
+
+
+def _zip_compress_type(name):
+    """按文件名选择 zip 压缩方式：二进制与已压缩文件用 STORED，其余 DEFLATED"""
+    if name.endswith(ZIP_STORED_EXTS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
 def create_zip_archive(tool_name, target_dir, files_to_compress):
     """创建 ZIP 压缩文件"""
-    zip_path = target_dir / f"{tool_name}.zip"
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for file in files_to_compress:
-            zipf.write(file, file.name)
-            print(f"  ✓ 添加到 zip: {file.name}")
-    print(f"  ✓ 创建 zip: {zip_path}")
-    return zip_path
+    zip_name = f"{tool_name}.zip"
+    zip_path = os.path.join(target_dir, zip_name)
+    log_lines = []
+    with open(zip_path, 'wb', buffering=ARCHIVE_BUFFER_SIZE) as fh:
+        with zipfile.ZipFile(fh, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for entry in files_to_compress:
+                zipf.write(entry.path, entry.name, compress_type=_zip_compress_type(entry.name))
+                if VERBOSE:
+                    log_lines.append(f"  ✓ 添加到 zip: {entry.name}")
+    log_lines.append(f"  ✓ 创建 zip: {zip_path}")
+    print('\n'.join(log_lines))
+    return {'name': zip_name, 'size': os.path.getsize(zip_path)}
 
 
 def create_7z_archive(tool_name, target_dir, files_to_compress):
@@ -119,60 +220,141 @@ def create_7z_archive(tool_name, target_dir, files_to_compress):
     except ImportError:
         print(f"  ⚠ 警告: 需要 py7zr 库来创建 7z 文件，回退到 zip 格式")
         return create_zip_archive(tool_name, target_dir, files_to_compress)
-    
-    zip_path = target_dir / f"{tool_name}.7z"
-    with py7zr.SevenZipFile(zip_path, 'w') as archive:
-        for file in files_to_compress:
-            archive.write(file, file.name)
-            print(f"  ✓ 添加到 7z: {file.name}")
-    print(f"  ✓ 创建 7z: {zip_path}")
-    return zip_path
+
+    archive_name = f"{tool_name}.7z"
+    archive_path = os.path.join(target_dir, archive_name)
+    log_lines = []
+    with py7zr.SevenZipFile(archive_path, 'w') as archive:
+        for entry in files_to_compress:
+            archive.write(entry.path, entry.name)
+            if VERBOSE:
+                log_lines.append(f"  ✓ 添加到 7z: {entry.name}")
+    log_lines.append(f"  ✓ 创建 7z: {archive_path}")
+    print('\n'.join(log_lines))
+    return {'name': archive_name, 'size': os.path.getsize(archive_path)}
+
+
+def _tar_add_file(tar, file_ref):
+    """用 FileRef 里缓存的元数据手工构造 TarInfo 写入
+
+    绕过 tar.add 内部的 lstat：元数据在统一扫描阶段已经拿到了。
+    """
+    tarinfo = tarfile.TarInfo(name=file_ref.name)
+    tarinfo.size = file_ref.size
+    tarinfo.mtime = file_ref.mtime
+    tarinfo.mode = file_ref.mode
+    with open(file_ref.path, 'rb') as f:
+        tar.addfile(tarinfo, f)
+
+
+def _create_tar_archive(tool_name, target_dir, files_to_compress, ext, mode, **tar_kwargs):
+    """创建 tar 系列压缩文件的公共实现（大块缓冲写 + 批量日志）"""
+    tar_name = f"{tool_name}.{ext}"
+    tar_path = os.path.join(target_dir, tar_name)
+    log_lines = []
+    with open(tar_path, 'wb', buffering=ARCHIVE_BUFFER_SIZE) as fh:
+        with tarfile.open(fileobj=fh, mode=mode, bufsize=TAR_BUFSIZE, **tar_kwargs) as tar:
+            for entry in files_to_compress:
+                _tar_add_file(tar, entry)
+                if VERBOSE:
+                    log_lines.append(f"  ✓ 添加到 {ext}: {entry.name}")
+    log_lines.append(f"  ✓ 创建 {ext}: {tar_path}")
+    print('\n'.join(log_lines))
+    return {'name': tar_name, 'size': os.path.getsize(tar_path)}
+
+
+def _create_tar_gz_pigz(tool_name, target_dir, files_to_compress):
+    """通过 pigz 管道创建 tar.gz，失败时清理残缺输出并抛出异常"""
+    tar_name = f"{tool_name}.tar.gz"
+    tar_path = os.path.join(target_dir, tar_name)
+    log_lines = []
+    # 总核数按进程池宽度均分，与 build.py 的 _cargo_jobs 同一套算法
+    threads = max(1, (os.cpu_count() or 1) // ARCHIVE_POOL_WORKERS)
+    try:
+        with open(tar_path, 'wb', buffering=ARCHIVE_BUFFER_SIZE) as out:
+            proc = subprocess.Popen(['pigz', '-p', str(threads), '-c'],
+                                    stdin=subprocess.PIPE, stdout=out)
+            try:
+                with tarfile.open(fileobj=proc.stdin, mode='w|', bufsize=TAR_BUFSIZE) as tar:
+                    for entry in files_to_compress:
+                        _tar_add_file(tar, entry)
+                        if VERBOSE:
+                            log_lines.append(f"  ✓ 添加到 tar.gz: {entry.name}")
+            finally:
+                proc.stdin.close()
+                proc.wait()
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, 'pigz')
+    except Exception:
+        # 留下半截文件会被指纹缓存当成最新产物，必须删掉
+        try:
+            os.remove(tar_path)
+        except OSError:
+            pass
+        raise
+    log_lines.append(f"  ✓ 创建 tar.gz: {tar_path} (pigz)")
+    print('\n'.join(log_lines))
+    return {'name': tar_name, 'size': os.path.getsize(tar_path)}
 
 
 def create_tar_gz_archive(tool_name, target_dir, files_to_compress):
-    """创建 tar.gz 压缩文件"""
-    tar_path = target_dir / f"{tool_name}.tar.gz"
-    with tarfile.open(tar_path, 'w:gz') as tar:
-        for file in files_to_compress:
-            tar.add(file, arcname=file.name)
-            print(f"  ✓ 添加到 tar.gz: {file.name}")
-    print(f"  ✓ 创建 tar.gz: {tar_path}")
-    return tar_path
+    """创建 tar.gz 压缩文件（系统有 pigz 时走多核 gzip 管道）"""
+    if shutil.which('pigz') is not None:
+        try:
+            return _create_tar_gz_pigz(tool_name, target_dir, files_to_compress)
+        except (OSError, subprocess.SubprocessError) as e:
+            # pigz 异常退出或管道中断只影响本压缩包，回退内置 gzip 重建
+            print(f"  ⚠ 警告: pigz 压缩失败（{e}），回退到内置 gzip")
+    # 标准库 gzip 单线程，作为 pigz 缺失或失败时的回退
+    return _create_tar_archive(tool_name, target_dir, files_to_compress, 'tar.gz', 'w:gz')
 
 
 def create_tar_xz_archive(tool_name, target_dir, files_to_compress):
     """创建 tar.xz 压缩文件"""
-    tar_path = target_dir / f"{tool_name}.tar.xz"
-    with tarfile.open(tar_path, 'w:xz') as tar:
-        for file in files_to_compress:
-            tar.add(file, arcname=file.name)
-            print(f"  ✓ 添加到 tar.xz: {file.name}")
-    print(f"  ✓ 创建 tar.xz: {tar_path}")
-    return tar_path
+    return _create_tar_archive(tool_name, target_dir, files_to_compress, 'tar.xz', 'w:xz',
+                               preset=XZ_PRESET)
 
 
 def create_tar_bz2_archive(tool_name, target_dir, files_to_compress):
     """创建 tar.bz2 压缩文件"""
-    tar_path = target_dir / f"{tool_name}.tar.bz2"
-    with tarfile.open(tar_path, 'w:bz2') as tar:
-        for file in files_to_compress:
-            tar.add(file, arcname=file.name)
-            print(f"  ✓ 添加到 tar.bz2: {file.name}")
-    print(f"  ✓ 创建 tar.bz2: {tar_path}")
-    return tar_path
+    return _create_tar_archive(tool_name, target_dir, files_to_compress, 'tar.bz2', 'w:bz2',
+                               compresslevel=BZ2_COMPRESSLEVEL)
 
 
-def create_compressed_archive(tool_dir, target_dir, target_name, compress_format):
-    """根据指定格式创建压缩文件"""
-    tool_name = tool_dir.name
-    
-    # 获取需要压缩的文件
-    files_to_compress = get_files_to_compress(tool_dir, target_dir, tool_name)
-    
+def create_tar_zst_archive(tool_name, target_dir, files_to_compress):
+    """创建 tar.zst 压缩文件（需要 zstandard 库，threads=-1 用满所有核）"""
+    try:
+        import zstandard
+    except ImportError:
+        print(f"  ⚠ 警告: 需要 zstandard 库来创建 tar.zst 文件，回退到 tar.gz 格式")
+        return create_tar_gz_archive(tool_name, target_dir, files_to_compress)
+
+    tar_name = f"{tool_name}.tar.zst"
+    tar_path = os.path.join(target_dir, tar_name)
+    log_lines = []
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1)
+    with open(tar_path, 'wb', buffering=ARCHIVE_BUFFER_SIZE) as out:
+        with compressor.stream_writer(out) as writer:
+            with tarfile.open(fileobj=writer, mode='w|', bufsize=TAR_BUFSIZE) as tar:
+                for entry in files_to_compress:
+                    _tar_add_file(tar, entry)
+                    if VERBOSE:
+                        log_lines.append(f"  ✓ 添加到 tar.zst: {entry.name}")
+    log_lines.append(f"  ✓ 创建 tar.zst: {tar_path}")
+    print('\n'.join(log_lines))
+    return {'name': tar_name, 'size': os.path.getsize(tar_path)}
+
+
+def create_compressed_archive(tool_name, target_dir, files_to_compress, compress_format):
+    """根据指定格式创建压缩文件，返回压缩包的清单条目 {'name', 'size'}
+
+    纯函数：入参只有基本类型和 FileRef，可以直接交给进程池执行。
+    路径全程用纯字符串拼接，不在热路径上构造 Path 对象。
+    """
     if not files_to_compress:
         print(f"  ⚠ 警告: {target_dir} 中没有找到需要打包的文件")
         return None
-    
+
     # 根据格式创建压缩文件
     if compress_format == 'zip':
         return create_zip_archive(tool_name, target_dir, files_to_compress)
@@ -184,89 +366,171 @@ def create_compressed_archive(tool_dir, target_dir, target_name, compress_format
         return create_tar_xz_archive(tool_name, target_dir, files_to_compress)
     elif compress_format == 'tar.bz2':
         return create_tar_bz2_archive(tool_name, target_dir, files_to_compress)
+    elif compress_format == 'tar.zst':
+        return create_tar_zst_archive(tool_name, target_dir, files_to_compress)
     else:
         print(f"  ⚠ 警告: 不支持的压缩格式: {compress_format}，跳过压缩")
         return None
 
 
-def get_files_in_directory(directory):
-    """获取目录中的所有文件列表"""
-    files = []
-    if directory.exists():
-        for file in directory.iterdir():
-            if file.is_file():
-                files.append({
-                    'name': file.name,
-                    'size': file.stat().st_size,
-                })
-    return files
+def _archive_cache_key(entries):
+    """对输入文件集合的 (名称, 大小, mtime) 排序后哈希，作为增量跳过的指纹"""
+    digest = hashlib.blake2b(digest_size=16)
+    stats = sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                   for entry in entries)
+    for name, size, mtime_ns in stats:
+        digest.update(f"{name}\0{size}\0{mtime_ns}\0".encode())
+    return digest.hexdigest()
+
+
+def load_archive_cache(dist_path):
+    """加载压缩指纹缓存"""
+    try:
+        with open(dist_path / ARCHIVE_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_archive_cache(dist_path, cache):
+    """写回压缩指纹缓存（失败不影响主流程）"""
+    try:
+        with open(dist_path / ARCHIVE_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2)
+    except OSError:
+        pass
 
 
-def process_tool(tool_dir, manifest_data):
-    """处理单个工具目录"""
+def run_archive_job(job):
+    """进程池入口：执行单个压缩任务"""
+    return create_compressed_archive(*job)
+
+
+def plan_tool_archives(tool_dir, dist_meta, archive_cache):
+    """为单个工具创建缺失的目标平台目录，并收集需要执行的压缩任务
+
+    返回 (任务元组列表, {压缩包路径: 输入指纹})；输入指纹与缓存一致且
+    压缩包仍存在的目标直接跳过，不进入任务列表。
+    """
     tool_name = tool_dir.name
+    tool_dir_s = os.fspath(tool_dir)
     print(f"\n处理工具: {tool_name}")
-    
-    # 获取工具版本
-    version = get_tool_version(tool_name)
-    
+
     # 获取压缩配置
     compress_config = get_tool_compress_config(tool_name)
     should_compress = compress_config['compress']
-    
-    # 获取现有的目标平台目录
-    existing_targets = set()
-    for item in tool_dir.iterdir():
-        if item.is_dir() and item.name in TARGETS:
-            existing_targets.add(item.name)
-    
+
+    # 从预扫描结果中取现有的目标平台目录
+    existing_targets = {
+        target for (tool, target) in dist_meta
+        if tool == tool_name and target in TARGETS_SET
+    }
+
     # 创建缺失的目标平台目录
-    missing_targets = set(TARGETS) - existing_targets
+    missing_targets = TARGETS_SET - existing_targets
     for target_name in missing_targets:
-        target_dir = tool_dir / target_name
-        target_dir.mkdir(parents=True, exist_ok=True)
+        os.makedirs(os.path.join(tool_dir_s, target_name), exist_ok=True)
         print(f"  ✓ 创建缺失目录: {target_name}")
-    
+
+    if not should_compress:
+        return [], {}
+
+    jobs = []
+    pending_keys = {}
+    for target_name in TARGETS:
+        target_dir = os.path.join(tool_dir_s, target_name)
+
+        # 根据目标平台类型选择压缩格式
+        if is_windows_target(target_name):
+            compress_format = compress_config['windows_format']
+        else:
+            compress_format = compress_config['non_windows_format']
+
+        print(f"  目标平台: {target_name} (压缩格式: {compress_format})")
+        entries = dist_meta.get((tool_name, target_name), [])
+        files_to_compress = get_files_to_compress(entries, tool_name)
+
+        # 输入集合未变化且压缩包还在时跳过重建
+        archive_path = os.path.join(target_dir, f"{tool_name}.{compress_format}")
+        if files_to_compress:
+            cache_key = _archive_cache_key(files_to_compress)
+            if archive_cache.get(archive_path) == cache_key and os.path.exists(archive_path):
+                print(f"  ✓ 输入未变化，跳过压缩: {archive_path}")
+                continue
+            pending_keys[archive_path] = cache_key
+
+        files = []
+        for entry in files_to_compress:
+            st = entry.stat()
+            files.append(FileRef(entry.path, entry.name, st.st_size,
+                                 int(st.st_mtime), st.st_mode & 0o777))
+        jobs.append((tool_name, target_dir, files, compress_format))
+
+    return jobs, pending_keys
+
+
+def collect_tool_manifest(tool_dir, dist_meta, archive_results):
+    """收集并返回单个工具的清单信息（在压缩任务全部完成后调用）
+
+    文件列表直接来自预扫描的 DirEntry 批次，新产出的压缩包条目由
+    压缩任务自己返回并补入，不再对目录做第二次扫描。
+    """
+    tool_name = tool_dir.name
+
     # 收集工具信息
     tool_info = {
         'crate_name': tool_name,
-        'version': version,
+        'version': get_tool_version(tool_name),
         'source': 'crates.io',
         'targets': {}
     }
-    
-    # 遍历所有目标平台目录
+
+    # 遍历所有目标平台目录，收集文件列表（包括刚创建的压缩文件）；
+    # 规划阶段已补齐缺失目录，这里无需再逐个 stat 确认存在
     for target_name in TARGETS:
-        target_dir = tool_dir / target_name
-        if not target_dir.exists():
-            continue
-        
-        print(f"  目标平台: {target_name}")
-        
-        # 如果需要压缩，根据目标平台类型选择压缩格式
-        if should_compress:
-            if is_windows_target(target_name):
-                compress_format = compress_config['windows_format']
-            else:
-                compress_format = compress_config['non_windows_format']
-            
-            print(f"  压缩格式: {compress_format}")
-            create_compressed_archive(tool_dir, target_dir, target_name, compress_format)
-        
-        # 收集该目标平台的文件列表（包括可能刚创建的压缩文件）
-        files = get_files_in_directory(target_dir)
+        entries = dist_meta.get((tool_name, target_name), [])
+        files = [{'name': entry.name, 'size': entry.stat().st_size}
+                 for entry in entries]
+
+        # 本轮重建的压缩包：替换预扫描里的同名旧条目
+        archive_info = archive_results.get((tool_name, target_name))
+        if archive_info:
+            files = [f for f in files if f['name'] != archive_info['name']]
+            files.append(archive_info)
+
         tool_info['targets'][target_name] = {
             'files': files
         }
-    
-    manifest_data['tools'].append(tool_info)
+
+    return tool_info
+
+
+def _dumps_tool(tool_info):
+    """序列化单个工具的清单条目（可用时走 orjson）"""
+    if _orjson is not None:
+        # orjson 原生输出 UTF-8 字节，非 ASCII 字符不转义，与 ensure_ascii=False 一致
+        return _orjson.dumps(tool_info, option=_orjson.OPT_INDENT_2).decode()
+    return json.dumps(tool_info, indent=2, ensure_ascii=False)
 
 
-def generate_manifest(manifest_data, dist_path):
-    """生成清单文件"""
+def generate_manifest(tool_infos, dist_path):
+    """流式生成清单文件
+
+    逐个工具序列化写盘，整份清单不在内存中聚合，峰值内存与工具
+    数量无关。
+    """
     manifest_path = dist_path / MANIFEST_FILE
     with open(manifest_path, 'w', encoding='utf-8') as f:
-        json.dump(manifest_data, f, indent=2, ensure_ascii=False)
+        f.write('{\n')
+        f.write(f'  "generated_at": {json.dumps(datetime.now().isoformat())},\n')
+        f.write('  "source": "crates.io",\n')
+        f.write('  "tools": [')
+        count = 0
+        for tool_info in tool_infos:
+            body = '\n'.join('    ' + line for line in _dumps_tool(tool_info).splitlines())
+            f.write((',\n' if count else '\n') + body)
+            count += 1
+        f.write('\n  ]\n}\n' if count else ']\n}\n')
     print(f"\n✓ 生成清单文件: {manifest_path}")
 
 
@@ -282,22 +546,43 @@ def main():
     print(f"开始处理 {DIST_DIR} 目录下的编译产物...")
     print("=" * 60)
     
-    # 初始化清单数据
-    manifest_data = {
-        'generated_at': datetime.now().isoformat(),
-        'source': 'crates.io',
-        'tools': []
-    }
-    
-    # 遍历 dist 目录下的所有工具
-    tools_processed = 0
-    for tool_dir in dist_path.iterdir():
-        if tool_dir.is_dir() and tool_dir.name != MANIFEST_FILE.replace('.json', ''):
-            process_tool(tool_dir, manifest_data)
-            tools_processed += 1
-    
-    # 生成清单文件
-    generate_manifest(manifest_data, dist_path)
+    # 预扫描整棵 dist 树的元数据，处理阶段不再逐目录发起扫描
+    dist_meta = prefetch_dist(dist_path)
+
+    tool_dirs = [
+        tool_dir for tool_dir in dist_path.iterdir()
+        if tool_dir.is_dir() and tool_dir.name != MANIFEST_STEM
+    ]
+
+    # 阶段1: 创建缺失目录并收集所有压缩任务（指纹未变的直接跳过）
+    archive_cache = load_archive_cache(dist_path)
+    jobs = []
+    pending_keys = {}
+    for tool_dir in tool_dirs:
+        tool_jobs, tool_keys = plan_tool_archives(tool_dir, dist_meta, archive_cache)
+        jobs.extend(tool_jobs)
+        pending_keys.update(tool_keys)
+
+    # 阶段2: 压缩是 CPU 密集型且任务间相互独立，用进程池并行执行
+    archive_results = {}
+    if jobs:
+        with ProcessPoolExecutor(max_workers=ARCHIVE_POOL_WORKERS) as executor:
+            results = list(executor.map(run_archive_job, jobs))
+        for (tool_name, target_dir, _files, _fmt), info in zip(jobs, results):
+            if info:
+                archive_results[(tool_name, os.path.basename(target_dir))] = info
+
+    # 记录本轮成功产出的压缩包指纹，下次输入未变化即可跳过
+    for archive_path, cache_key in pending_keys.items():
+        if os.path.exists(archive_path):
+            archive_cache[archive_path] = cache_key
+    save_archive_cache(dist_path, archive_cache)
+
+    # 阶段3: 压缩完成后流式收集并写出清单，每个工具的条目即收即写
+    tool_infos = (collect_tool_manifest(tool_dir, dist_meta, archive_results)
+                  for tool_dir in tool_dirs)
+    generate_manifest(tool_infos, dist_path)
+    tools_processed = len(tool_dirs)
     
     print("=" * 60)
     print(f"处理完成！共处理 {tools_processed} 个工具")